@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+IDEMPOTENCY STORE
+Replays responses for retried POSTs that carry an Idempotency-Key
+
+Bounded (oldest stored entries are dropped first) and TTL-evicted.
+Concurrent requests with the same key are coalesced onto the first one.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class IdempotencyStore:
+    """Bounded, TTL-evicted store of responses keyed by Idempotency-Key
+
+    The first request for a key runs the handler; concurrent duplicates
+    wait for it to finish and later duplicates replay the stored response.
+    """
+    
+    def __init__(self, max_entries=1024, ttl_seconds=24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (stored_at, fingerprint, status, data)
+        self._in_flight = {}  # key -> (fingerprint, threading.Event)
+        self._lock = threading.Lock()
+    
+    def begin(self, key, fingerprint, wait_timeout=30):
+        """Claim a key. Returns ('run', None), ('replay', (status, data)),
+        ('conflict', None) when the key was used with a different body, or
+        ('busy', None) when the original request is still running."""
+        while True:
+            with self._lock:
+                self._evict_expired()
+                entry = self._entries.get(key)
+                if entry:
+                    if entry[1] != fingerprint:
+                        return 'conflict', None
+                    # No move_to_end here: _evict_expired relies on the
+                    # dict staying in stored_at order
+                    return 'replay', (entry[2], entry[3])
+                
+                pending = self._in_flight.get(key)
+                if not pending:
+                    self._in_flight[key] = (fingerprint, threading.Event())
+                    return 'run', None
+                if pending[0] != fingerprint:
+                    return 'conflict', None
+                done = pending[1]
+            
+            # Coalesce: wait for the owner, then re-check the store. If the
+            # owner failed without storing a result, we take over the key.
+            if not done.wait(wait_timeout):
+                return 'busy', None
+    
+    def complete(self, key, status, data):
+        """Store the owner's response and wake any waiting duplicates"""
+        with self._lock:
+            fingerprint, done = self._in_flight.pop(key)
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time(), fingerprint, status, data)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        done.set()
+    
+    def release(self, key):
+        """Drop an in-flight key without storing (server errors stay retryable)"""
+        with self._lock:
+            pending = self._in_flight.pop(key, None)
+        if pending:
+            pending[1].set()
+    
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[0] > cutoff:
+                # Entries are only appended on complete(), so the dict is in
+                # stored_at order and the rest are newer
+                break
+            self._entries.popitem(last=False)
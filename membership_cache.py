@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+ACTIVE MEMBERSHIP CACHE
+In-process read-through cache: email / user_id -> tier, status, trial days
+
+TTL + size-bounded LRU. Entries are small __slots__ records with interned
+tier/status strings, so a cached member costs ~200 bytes.
+Writers (e.g. invite redemption) must call invalidate() after upserting.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Cached "no active membership" marker, stored so repeated sign-in attempts
+# for unknown emails don't hit the database either
+_MISSING = object()
+
+
+class Membership:
+    """Compact active-membership record"""
+
+    __slots__ = ('user_id', 'email', 'tier', 'status', 'trial_days', 'expires_at')
+
+    def __init__(self, user_id, email, tier, status, trial_days, expires_at=0.0):
+        self.user_id = str(user_id)
+        self.email = email
+        self.tier = sys.intern(tier) if tier else tier
+        self.status = sys.intern(status) if status else status
+        self.trial_days = trial_days
+        self.expires_at = expires_at
+
+    def as_dict(self):
+        return {
+            'id': self.user_id,
+            'email': self.email,
+            'membership_tier': self.tier,
+            'status': self.status,
+            'trial_days_remaining': self.trial_days
+        }
+
+
+class MembershipCache:
+    """Read-through LRU cache of active memberships keyed by email"""
+
+    def __init__(self, max_entries=10000, ttl_seconds=300, negative_ttl_seconds=30):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+
+        self._by_email = OrderedDict()  # email -> Membership | (expires_at, _MISSING)
+        self._email_by_user_id = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, email, loader):
+        """Return the cached Membership for email (or None), calling
+        loader(email) -> row dict | None on a miss.
+
+        The loader runs outside the lock; concurrent misses for the same
+        email may both query the database, which is harmless.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._by_email.get(email)
+            if entry is not None:
+                expires_at = entry[0] if isinstance(entry, tuple) else entry.expires_at
+                if expires_at > now:
+                    self._by_email.move_to_end(email)
+                    self.hits += 1
+                    return None if isinstance(entry, tuple) else entry
+                self._remove(email)
+            self.misses += 1
+            generation = self._generation
+
+        row = loader(email)
+        membership = self._from_row(email, row) if row else None
+
+        with self._lock:
+            # Skip the fill if a writer invalidated while we were loading,
+            # otherwise the pre-upsert row would be cached for a full TTL
+            if generation == self._generation:
+                self._store(email, membership)
+        return membership
+
+    def put(self, email, row):
+        """Store a loaded row (or None for "no active membership")"""
+        membership = self._from_row(email, row) if row else None
+        with self._lock:
+            self._store(email, membership)
+
+    def get_by_user_id(self, user_id):
+        """Cached Membership for a user id, without loading on a miss"""
+        with self._lock:
+            email = self._email_by_user_id.get(str(user_id))
+            entry = self._by_email.get(email) if email else None
+            if isinstance(entry, Membership) and entry.expires_at > time.time():
+                return entry
+            return None
+
+    def invalidate(self, email=None, user_id=None):
+        """Drop any entry for this email and/or user id"""
+        with self._lock:
+            if user_id is not None:
+                linked_email = self._email_by_user_id.get(str(user_id))
+                if linked_email:
+                    self._remove(linked_email)
+            if email is not None:
+                self._remove(email)
+            self._generation += 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._by_email.clear()
+            self._email_by_user_id.clear()
+
+    def stats(self):
+        """Hit-rate metrics for admin/monitoring endpoints"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._by_email),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def _from_row(self, email, row):
+        return Membership(
+            row['id'], email, row.get('membership_tier'), row.get('status'),
+            row.get('trial_days_remaining'), time.time() + self.ttl_seconds
+        )
+
+    def _store(self, email, membership):
+        # Caller holds the lock
+        self._remove(email)
+        if membership is None:
+            self._by_email[email] = (time.time() + self.negative_ttl_seconds, _MISSING)
+        else:
+            self._by_email[email] = membership
+            self._email_by_user_id[membership.user_id] = email
+        while len(self._by_email) > self.max_entries:
+            self._remove(next(iter(self._by_email)))
+            self.evictions += 1
+
+    def _remove(self, email):
+        # Caller holds the lock
+        entry = self._by_email.pop(email, None)
+        if isinstance(entry, Membership):
+            if self._email_by_user_id.get(entry.user_id) == email:
+                del self._email_by_user_id[entry.user_id]
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+ON-DEMAND REQUEST PROFILER
+Opt-in cProfile sampling + tracemalloc snapshots for the dev/auth servers
+
+Disabled unless configured, so the hot path costs a single attribute check:
+    PROFILE_SAMPLE_RATE=N     profile 1 in N requests (0 = off)
+    PROFILE_ADMIN_TOKEN=...   allows X-Profile-Token to force profiling of a
+                              request and unlocks the /__admin/ endpoints
+    PROFILE_FORCED_WAIT=5     seconds a token-forced request waits for the
+                              profiler if another request is being profiled
+
+Admin endpoints (GET, X-Profile-Token header required):
+    /__admin/profile?format=text|pstats|edges       aggregated profile
+    /__admin/profile/reset                          clear aggregated stats
+    /__admin/tracemalloc?action=start|snapshot|diff|stop
+"""
+
+import cProfile
+import hmac
+import io
+import itertools
+import marshal
+import os
+import pstats
+import threading
+import tracemalloc
+from urllib.parse import urlparse, parse_qs
+
+PROFILE_HEADER = 'X-Profile-Token'
+ADMIN_PREFIX = '/__admin/'
+
+
+class RequestProfiler:
+    """Samples requests with cProfile and aggregates the results"""
+
+    def __init__(self, sample_rate=0, admin_token='', forced_wait=5.0):
+        self.sample_rate = max(0, int(sample_rate))
+        self.admin_token = admin_token
+        self.enabled = bool(self.sample_rate or self.admin_token)
+        self.forced_wait = forced_wait
+        self.profiled_requests = 0
+        self.sampled_skipped = 0
+        self.forced_skipped = 0
+
+        self._counter = itertools.count(1)
+        self._stats = None
+        self._stats_lock = threading.Lock()
+        # cProfile can only have one active profiler per process on newer
+        # Pythons. Overlapping sampled requests are skipped; token-forced
+        # requests wait for the lock and take priority over sampling.
+        self._profile_lock = threading.Lock()
+        self._forced_waiting = 0
+        self._baseline_snapshot = None
+
+    @classmethod
+    def from_env(cls):
+        """Build a profiler from the PROFILE_* environment variables"""
+        return cls(
+            sample_rate=int(os.getenv('PROFILE_SAMPLE_RATE', '0') or 0),
+            admin_token=os.getenv('PROFILE_ADMIN_TOKEN', ''),
+            forced_wait=float(os.getenv('PROFILE_FORCED_WAIT', '5'))
+        )
+
+    def is_admin(self, handler):
+        """Check the request carries the admin profiling token"""
+        token = handler.headers.get(PROFILE_HEADER)
+        if not (self.admin_token and token):
+            return False
+        # Compare bytes: compare_digest raises TypeError on non-ASCII str
+        return hmac.compare_digest(token.encode('utf-8', 'surrogateescape'),
+                                   self.admin_token.encode('utf-8'))
+
+    def _sampled(self):
+        return bool(self.sample_rate and next(self._counter) % self.sample_rate == 0)
+
+    def run(self, handler, method):
+        """Call method(), profiling it for 1 in N requests or any request
+        carrying the admin token"""
+        if not self.enabled:
+            return method()
+        if self.is_admin(handler):
+            if not self._acquire_forced():
+                return method()
+        elif not self._sampled():
+            return method()
+        elif self._forced_waiting or not self._profile_lock.acquire(blocking=False):
+            with self._stats_lock:
+                self.sampled_skipped += 1
+            return method()
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                return method()
+            finally:
+                profile.disable()
+        finally:
+            self._profile_lock.release()
+            self._record(profile)
+
+    def _acquire_forced(self):
+        """Wait for the profiler on behalf of a token-forced request"""
+        with self._stats_lock:
+            self._forced_waiting += 1
+        acquired = False
+        try:
+            acquired = self._profile_lock.acquire(timeout=self.forced_wait)
+        finally:
+            with self._stats_lock:
+                self._forced_waiting -= 1
+                if not acquired:
+                    # Reported in the text profile so the gap is visible
+                    self.forced_skipped += 1
+        return acquired
+
+    def _record(self, profile):
+        with self._stats_lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.profiled_requests += 1
+
+    def reset(self):
+        """Drop aggregated stats"""
+        with self._stats_lock:
+            self._stats = None
+            self.profiled_requests = 0
+            self.sampled_skipped = 0
+            self.forced_skipped = 0
+
+    def render_text(self, limit=50):
+        """Aggregated stats as a pstats text report"""
+        with self._stats_lock:
+            skipped = (f'Skipped (profiler busy): {self.forced_skipped} forced, '
+                       f'{self.sampled_skipped} sampled\n')
+            if self._stats is None:
+                return 'No requests profiled yet\n' + skipped
+            out = io.StringIO()
+            self._stats.stream = out
+            out.write(f'Profiled requests: {self.profiled_requests}\n')
+            out.write(skipped)
+            self._stats.sort_stats('cumulative').print_stats(limit)
+            return out.getvalue()
+
+    def render_pstats(self):
+        """Aggregated stats in the binary format pstats.Stats() can load"""
+        with self._stats_lock:
+            if self._stats is None:
+                return b''
+            return marshal.dumps(self._stats.stats)
+
+    def render_edges(self):
+        """Call edges as "caller;callee microseconds" lines
+
+        pstats only keeps one level of callers, so these are caller/callee
+        pairs, not full stacks; don't feed them to a flamegraph tool. Use
+        format=pstats with snakeviz or gprof2dot for a call graph.
+        """
+        with self._stats_lock:
+            if self._stats is None:
+                return ''
+            lines = []
+            for func, (_, _, tottime, _, callers) in self._stats.stats.items():
+                callee = _frame_name(func)
+                if not callers:
+                    lines.append(f'{callee} {int(tottime * 1e6)}')
+                for caller, edge in callers.items():
+                    # edge is (cc, nc, tt, ct) for cProfile data
+                    edge_time = edge[2] if isinstance(edge, tuple) else tottime
+                    lines.append(f'{_frame_name(caller)};{callee} {int(edge_time * 1e6)}')
+            return '\n'.join(line for line in lines if not line.endswith(' 0')) + '\n'
+
+    def tracemalloc_action(self, action, limit=25):
+        """Start/stop tracemalloc, or report a snapshot / diff vs baseline"""
+        if action == 'start':
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '1')))
+            self._baseline_snapshot = tracemalloc.take_snapshot()
+            return 'tracemalloc started, baseline snapshot taken\n'
+        if action == 'stop':
+            tracemalloc.stop()
+            self._baseline_snapshot = None
+            return 'tracemalloc stopped\n'
+        if not tracemalloc.is_tracing():
+            return 'tracemalloc is not running (use action=start)\n'
+
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        out = [f'Traced memory: current={current} bytes peak={peak} bytes']
+        if action == 'diff' and self._baseline_snapshot is not None:
+            out.append(f'Top {limit} growth since baseline:')
+            out.extend(str(stat) for stat in
+                       snapshot.compare_to(self._baseline_snapshot, 'lineno')[:limit])
+        else:
+            out.append(f'Top {limit} allocations:')
+            out.extend(str(stat) for stat in snapshot.statistics('lineno')[:limit])
+        return '\n'.join(out) + '\n'
+
+    def handle_admin(self, handler):
+        """Serve /__admin/ endpoints. Returns True if the request was handled"""
+        if not handler.path.startswith(ADMIN_PREFIX):
+            return False
+        if not self.is_admin(handler):
+            handler.send_error(404, "Not found")
+            return True
+
+        parsed = urlparse(handler.path)
+        query = parse_qs(parsed.query)
+
+        if parsed.path == '/__admin/profile':
+            fmt = query.get('format', ['text'])[0]
+            if fmt == 'pstats':
+                self._send(handler, self.render_pstats(), 'application/octet-stream',
+                           'attachment; filename="requests.pstats"')
+            elif fmt == 'edges':
+                self._send(handler, self.render_edges().encode(), 'text/plain',
+                           'attachment; filename="requests.edges"')
+            else:
+                self._send(handler, self.render_text().encode(), 'text/plain')
+        elif parsed.path == '/__admin/profile/reset':
+            self.reset()
+            self._send(handler, b'Profile stats cleared\n', 'text/plain')
+        elif parsed.path == '/__admin/tracemalloc':
+            action = query.get('action', ['snapshot'])[0]
+            self._send(handler, self.tracemalloc_action(action).encode(), 'text/plain')
+        else:
+            handler.send_error(404, "Unknown admin endpoint")
+        return True
+
+    def _send(self, handler, body, content_type, disposition=None):
+        handler.send_response(200)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        handler.send_header('Cache-Control', 'no-store')
+        if disposition:
+            handler.send_header('Content-Disposition', disposition)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def _frame_name(func):
+    filename, lineno, name = func
+    if filename == '~':
+        return name  # built-in
+    return f'{os.path.basename(filename)}:{lineno}:{name}'
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Access-log replay benchmark for the static/dev servers
+Builds a request trace (synthesized page loads or a captured access log) and
+replays it against stable-server.py, start-server.py or tesla-server.py.
+
+Usage:
+    # Synthesize 200 page loads of dashboard / island / welcome with fan-out
+    python3 scripts/bench-access-replay.py synthesize --page-loads 200 -o trace.jsonl
+
+    # Or turn an existing server log into a trace
+    python3 scripts/bench-access-replay.py capture server.log -o trace.jsonl
+
+    # Replay at 16 concurrent clients against a running server
+    python3 scripts/bench-access-replay.py replay trace.jsonl --server stable -c 16
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Default page mix: (page, relative weight)
+DEFAULT_PAGES = (
+    ('hi-dashboard.html', 5),
+    ('hi-island-NEW.html', 3),
+    ('welcome.html', 2),
+)
+
+# Where each server listens and how it maps /<page> onto public/
+SERVER_PRESETS = {
+    'stable': {'url': 'http://127.0.0.1:8080', 'prefix': ''},  # smart routing
+    'start': {'url': 'http://127.0.0.1:5500', 'prefix': ''},   # serves public/
+    'tesla': {'url': 'http://127.0.0.1:7777', 'prefix': '/public'},  # repo root
+}
+
+# <link rel=...> values a browser fetches while loading the page
+FETCHED_LINK_RELS = {'stylesheet', 'icon', 'shortcut', 'apple-touch-icon',
+                     'manifest', 'preload', 'modulepreload'}
+
+# "GET /path HTTP/1.1" plus an optional [19/Oct/2026 12:00:00] timestamp.
+# start-server.py logs timestamps; stable-server.py lines have none, and
+# tesla-server.py doesn't log requests at all
+LOG_REQUEST_RE = re.compile(r'"(GET|HEAD) (\S+) HTTP/[\d.]+"')
+LOG_TIME_RE = re.compile(r'\[(\d{2}/\w{3}/\d{4})[ :](\d{2}:\d{2}:\d{2})')
+
+
+class AssetCollector(HTMLParser):
+    """Collects same-origin subresources a browser would request"""
+
+    def __init__(self):
+        super().__init__()
+        self.assets = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        url = None
+        if tag in ('script', 'img') and attrs.get('src'):
+            url = attrs['src']
+        elif tag == 'link' and attrs.get('href'):
+            rels = set((attrs.get('rel') or '').lower().split())
+            if rels & FETCHED_LINK_RELS:
+                url = attrs['href']
+        if url and not urlparse(url).netloc and not url.startswith(('data:', '#')):
+            self.assets.append(url)
+
+
+def page_fanout(page, public_dir):
+    """Page path followed by its same-origin asset paths, deduplicated"""
+    with open(os.path.join(public_dir, page), encoding='utf-8', errors='replace') as f:
+        collector = AssetCollector()
+        collector.feed(f.read())
+
+    page_path = '/' + page
+    paths = [page_path]
+    for asset in collector.assets:
+        path = urlparse(urljoin(page_path, asset))
+        full = path.path + ('?' + path.query if path.query else '')
+        if full not in paths:
+            paths.append(full)
+    return paths
+
+
+def synthesize(args):
+    """Write a trace of weighted page loads with Poisson arrivals"""
+    random.seed(args.seed)
+    pages = [(p.split(':')[0], float(p.split(':')[1]) if ':' in p else 1.0)
+             for p in args.pages] if args.pages else DEFAULT_PAGES
+    fanouts = {page: page_fanout(page, args.public_dir) for page, _ in pages}
+
+    now = 0.0
+    events = []
+    for _ in range(args.page_loads):
+        page = random.choices([p for p, _ in pages], weights=[w for _, w in pages])[0]
+        for path in fanouts[page]:
+            events.append({'t': round(now, 4), 'path': path, 'page': page})
+        now += random.expovariate(args.rate) if args.rate else 0.0
+
+    write_trace(events, args.output)
+    for page, paths in fanouts.items():
+        print(f'📄 {page}: {len(paths) - 1} subresources', file=sys.stderr)
+    print(f'✅ {len(events)} requests from {args.page_loads} page loads', file=sys.stderr)
+
+
+def capture(args):
+    """Convert server access-log lines into a trace"""
+    events = []
+    for log_path in args.logs:
+        with open(log_path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                match = LOG_REQUEST_RE.search(line)
+                if not match:
+                    continue
+                when = None
+                stamp = LOG_TIME_RE.search(line)
+                if stamp:
+                    when = datetime.strptime(' '.join(stamp.groups()),
+                                             '%d/%b/%Y %H:%M:%S').timestamp()
+                events.append({'t': when, 'method': match.group(1),
+                               'path': match.group(2)})
+
+    # Offsets from the earliest timestamp; untimed lines replay immediately
+    stamps = [e['t'] for e in events if e['t'] is not None]
+    first = min(stamps) if stamps else 0.0
+    if events and not stamps:
+        print('⚠️  No timestamps found in the log (stable-server.py prints none): '
+              'every request is at t=0, so replay --speed has no effect',
+              file=sys.stderr)
+    for event in events:
+        event['t'] = event['t'] - first if event['t'] is not None else 0.0
+    events.sort(key=lambda e: e['t'])
+
+    write_trace(events, args.output)
+    print(f'✅ Captured {len(events)} requests', file=sys.stderr)
+
+
+def write_trace(events, output):
+    out = open(output, 'w') if output and output != '-' else sys.stdout
+    try:
+        for event in events:
+            out.write(json.dumps(event) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def read_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class Replayer:
+    """Replays a trace with a fixed pool of HTTP clients"""
+
+    def __init__(self, base_url, prefix='', concurrency=8, timeout=10, speed=0.0):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.prefix = prefix.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.speed = speed  # 0 = as fast as possible, 1 = real time, 2 = 2x ...
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.bytes_received = 0
+        self.errors = 0
+        self.statuses = {}
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def fetch(self, event, started):
+        begin = time.perf_counter()
+        if self.speed:
+            # Time from the scheduled send, not the actual one, so queueing
+            # delay when the pool falls behind stays in the percentiles
+            # (avoids coordinated omission)
+            begin = started + event['t'] / self.speed
+            delay = begin - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        path = event['path']
+        if self.prefix and not (path == self.prefix or path.startswith(self.prefix + '/')):
+            path = self.prefix + path
+
+        status, size = 0, 0
+        try:
+            conn = self._connection()
+            conn.request(event.get('method', 'GET'), path)
+            response = conn.getresponse()
+            size = len(response.read())
+            status = response.status
+            if response.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            self._local.conn = None
+        elapsed = time.perf_counter() - begin
+
+        with self._lock:
+            self.latencies.append(elapsed)
+            self.bytes_received += size
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status == 0 or status >= 400:
+                self.errors += 1
+
+    def run(self, events):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            # Consume the iterator so worker exceptions surface here
+            list(pool.map(lambda event: self.fetch(event, started), events))
+        return time.perf_counter() - started
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def replay(args):
+    preset = SERVER_PRESETS.get(args.server, {})
+    base_url = args.url or preset.get('url', 'http://127.0.0.1:8080')
+    prefix = args.prefix if args.prefix is not None else preset.get('prefix', '')
+
+    events = read_trace(args.trace)
+    if args.limit:
+        events = events[:args.limit]
+    if not events:
+        sys.exit('❌ Trace is empty')
+
+    if args.warmup:
+        Replayer(base_url, prefix, args.concurrency, args.timeout).run(events[:args.warmup])
+
+    replayer = Replayer(base_url, prefix, args.concurrency, args.timeout, args.speed)
+    elapsed = replayer.run(events)
+
+    latencies = sorted(replayer.latencies)
+    total = len(latencies)
+    report = {
+        'server': args.server or base_url,
+        'base_url': base_url + prefix,
+        'concurrency': args.concurrency,
+        'requests': total,
+        'duration_s': round(elapsed, 3),
+        'requests_per_s': round(total / elapsed, 1),
+        'bytes_per_s': round(replayer.bytes_received / elapsed, 1),
+        'error_rate': round(replayer.errors / total, 4),
+        'latency_ms': {
+            'mean': round(1000 * sum(latencies) / total, 2),
+            'p50': round(1000 * percentile(latencies, 50), 2),
+            'p90': round(1000 * percentile(latencies, 90), 2),
+            'p99': round(1000 * percentile(latencies, 99), 2),
+            'max': round(1000 * latencies[-1], 2),
+        },
+        'status_counts': {str(k): v for k, v in sorted(replayer.statuses.items())},
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print('📊 ACCESS-LOG REPLAY')
+    print('=' * 40)
+    print(f"🌐 Target:      {report['base_url']} ({report['server']})")
+    print(f"🔀 Concurrency: {args.concurrency}")
+    print(f"📨 Requests:    {total} in {report['duration_s']}s")
+    print(f"⚡ Throughput:  {report['requests_per_s']} req/s, "
+          f"{report['bytes_per_s'] / 1024:.1f} KiB/s")
+    lat = report['latency_ms']
+    print(f"⏱️  Latency ms:  p50={lat['p50']} p90={lat['p90']} p99={lat['p99']} "
+          f"max={lat['max']} mean={lat['mean']}")
+    print(f"❌ Error rate:  {100 * report['error_rate']:.2f}% {report['status_counts']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Access-log replay benchmark')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    syn = sub.add_parser('synthesize', help='build a trace from page fan-out')
+    syn.add_argument('--page-loads', type=int, default=100)
+    syn.add_argument('--pages', nargs='*',
+                     help='pages with optional weights, e.g. welcome.html:2')
+    syn.add_argument('--rate', type=float, default=5.0,
+                     help='page loads per second in trace time (0 = all at t=0)')
+    syn.add_argument('--public-dir', default=os.path.join(REPO_ROOT, 'public'))
+    syn.add_argument('--seed', type=int, default=42)
+    syn.add_argument('-o', '--output', default='-')
+    syn.set_defaults(func=synthesize)
+
+    cap = sub.add_parser('capture', help='build a trace from server logs')
+    cap.add_argument('logs', nargs='+')
+    cap.add_argument('-o', '--output', default='-')
+    cap.set_defaults(func=capture)
+
+    rep = sub.add_parser('replay', help='replay a trace against a server')
+    rep.add_argument('trace')
+    rep.add_argument('--server', choices=sorted(SERVER_PRESETS),
+                     help='use the default URL/path prefix for a repo server')
+    rep.add_argument('--url', help='base URL (overrides --server)')
+    rep.add_argument('--prefix', help='path prefix, e.g. /public for tesla-server.py '
+                     '(not added to paths that already start with it)')
+    rep.add_argument('-c', '--concurrency', type=int, default=8)
+    rep.add_argument('--speed', type=float, default=0.0,
+                     help='follow trace timing at this multiple (0 = closed loop)')
+    rep.add_argument('--warmup', type=int, default=0, help='unmeasured warm-up requests')
+    rep.add_argument('--limit', type=int, default=0)
+    rep.add_argument('--timeout', type=float, default=10.0)
+    rep.add_argument('--json', action='store_true', help='print the report as JSON')
+    rep.set_defaults(func=replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Membership cache benchmark
+Replays a skewed sign-in workload, arriving at a fixed rate on a simulated
+clock, through the same steps as handle_email_signin with and without
+MembershipCache. Reports the hit rate, plus DB connections and statements
+per sign-in as the server actually issues them, and memory per entry.
+
+Usage:
+    python3 scripts/bench-membership-cache.py --requests 200000 --rate 5
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from membership_cache import MembershipCache  # noqa: E402
+
+TIERS = ('BETA', 'VIP', 'FRIEND', 'STAN')
+
+
+class SimulatedClock:
+    """Stands in for time.time() so TTLs expire at the simulated rate"""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMembershipDB:
+    """Counts the connections and statements handle_email_signin issues"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.connections = 0
+        self.selects = 0  # auth.users / user_memberships join
+        self.inserts = 0  # magic_links insert with its EXISTS status re-check
+
+    def connect(self):
+        self.connections += 1
+
+    def fetch_active_membership(self, email):
+        self.selects += 1
+        return self.rows.get(email)
+
+    def insert_magic_link(self):
+        self.inserts += 1
+
+
+def build_memberships(users, inactive_ratio):
+    """Active membership rows by email; inactive users have none"""
+    rows = {}
+    for i in range(users):
+        if random.random() < inactive_ratio:
+            continue
+        email = f'user{i}@example.com'
+        rows[email] = {
+            'id': f'00000000-0000-4000-8000-{i:012d}',
+            'email': email,
+            'membership_tier': random.choice(TIERS),
+            'status': 'active',
+            'trial_days_remaining': random.choice((7, 30, 90))
+        }
+    return rows
+
+
+def uncached_signin(db, email):
+    """handle_email_signin before the cache: always connect and join"""
+    db.connect()
+    if db.fetch_active_membership(email):
+        db.insert_magic_link()
+
+
+def cached_signin(db, cache, email):
+    """handle_email_signin today: connect lazily, only on a miss or a write"""
+    connected = False
+
+    def load_membership(lookup_email):
+        nonlocal connected
+        db.connect()
+        connected = True
+        return db.fetch_active_membership(lookup_email)
+
+    if not cache.get(email, load_membership):
+        return
+    if not connected:
+        db.connect()
+    db.insert_magic_link()
+
+
+def build_workload(requests, users, zipf_s, unknown_ratio):
+    """Zipf-skewed emails: a few members sign in far more than others"""
+    weights = [1.0 / (rank ** zipf_s) for rank in range(1, users + 1)]
+    picks = random.choices(range(users), weights=weights, k=requests)
+    workload = []
+    for i in picks:
+        if random.random() < unknown_ratio:
+            workload.append(f'stranger{random.randrange(users)}@example.com')
+        else:
+            workload.append(f'user{i}@example.com')
+    return workload
+
+
+def run(args):
+    random.seed(args.seed)
+    rows = build_memberships(args.users, args.inactive_ratio)
+    workload = build_workload(args.requests, args.users, args.zipf, args.unknown_ratio)
+    # Poisson arrivals at --rate sign-ins per second of simulated time
+    gaps = [random.expovariate(args.rate) for _ in workload]
+
+    baseline_db = FakeMembershipDB(rows)
+    cached_db = FakeMembershipDB(rows)
+    cache = MembershipCache(max_entries=args.max_entries, ttl_seconds=args.ttl,
+                            negative_ttl_seconds=args.negative_ttl)
+
+    clock = SimulatedClock()
+    started_at = clock.now
+    started = time.perf_counter()
+    with mock.patch('membership_cache.time.time', clock):
+        for n, (email, gap) in enumerate(zip(workload, gaps), 1):
+            clock.now += gap
+            uncached_signin(baseline_db, email)
+            cached_signin(cached_db, cache, email)
+            # Invite redemptions upsert a membership and invalidate its entry
+            if args.invite_every and n % args.invite_every == 0:
+                cache.invalidate(email=email)
+    elapsed = time.perf_counter() - started
+    simulated = clock.now - started_at
+
+    stats = cache.stats()
+    requests = args.requests
+    print('Membership cache benchmark')
+    print('=' * 40)
+    print(f'Sign-ins:          {requests} at {args.rate}/s '
+          f'({simulated / 3600:.1f}h simulated)')
+    print(f'Distinct users:    {args.users} (zipf s={args.zipf})')
+    print(f'Cache size / TTL:  {args.max_entries} entries / {args.ttl}s '
+          f'(negative {args.negative_ttl}s)')
+    print(f'Hit rate:          {100 * stats["hit_rate"]:.1f}%')
+    print(f'Evictions:         {stats["evictions"]}')
+    print(f'Invalidations:     {stats["invalidations"]}')
+    print('Per sign-in:         uncached   cached')
+    for label, before, after in (
+        ('connections', baseline_db.connections, cached_db.connections),
+        ('membership joins', baseline_db.selects, cached_db.selects),
+        ('magic_link writes', baseline_db.inserts, cached_db.inserts),
+        ('statements', baseline_db.selects + baseline_db.inserts,
+         cached_db.selects + cached_db.inserts),
+    ):
+        print(f'  {label:<18} {before / requests:>8.3f} {after / requests:>8.3f}')
+    print('  (each magic_link write re-checks membership status via EXISTS)')
+    print(f'Throughput:        {requests / elapsed:,.0f} sign-ins/s (both paths, wall clock)')
+    print(f'Memory:            {measure_entry_size(cached_db):.0f} bytes/entry')
+
+
+def measure_entry_size(db, sample=5000):
+    """Average traced bytes per cached membership (entry + index overhead)"""
+    rows = list(db.rows.values())[:sample]
+    cache = MembershipCache(max_entries=len(rows) + 1)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for row in rows:
+        cache.put(row['email'], row)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return grown / max(len(rows), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--zipf', type=float, default=1.1, help='workload skew exponent')
+    parser.add_argument('--max-entries', type=int, default=10000)
+    parser.add_argument('--ttl', type=int, default=300)
+    parser.add_argument('--negative-ttl', type=int, default=30)
+    parser.add_argument('--inactive-ratio', type=float, default=0.1)
+    parser.add_argument('--unknown-ratio', type=float, default=0.02)
+    parser.add_argument('--invite-every', type=int, default=500,
+                        help='invalidate one entry every N requests (0 = never)')
+    parser.add_argument('--rate', type=float, default=5.0,
+                        help='sign-ins per second of simulated time')
+    parser.add_argument('--seed', type=int, default=42)
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
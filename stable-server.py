@@ -8,11 +8,24 @@ import socketserver
 import os
 import sys
 from urllib.parse import urlparse, unquote
+from request_profiler import RequestProfiler
+
+# Opt-in request profiling (PROFILE_SAMPLE_RATE / PROFILE_ADMIN_TOKEN)
+PROFILER = RequestProfiler.from_env()
 
 class StableHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     """Tesla-grade HTTP handler with smart routing"""
     
     def do_GET(self):
+        """Handle GET requests, profiling them when enabled"""
+        if PROFILER.enabled:
+            if PROFILER.handle_admin(self):
+                return
+            PROFILER.run(self, self.route_get)
+        else:
+            self.route_get()
+    
+    def route_get(self):
         """Handle GET requests with intelligent routing"""
         parsed_path = urlparse(self.path)
         clean_path = unquote(parsed_path.path)
@@ -76,6 +89,8 @@ def main():
     print("🔧 Smart routing enabled for common path issues")
     print("🛡️ Security protections active")
     print("📊 Enhanced logging with status indicators")
+    if PROFILER.enabled:
+        print("📈 Profiling enabled (admin endpoints under /__admin/)")
     print("=" * 40)
     
     try:
@@ -13,7 +13,7 @@ import hashlib
 import hmac
 import time
 import secrets
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -21,6 +21,33 @@ import os
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from request_profiler import RequestProfiler
+from membership_cache import MembershipCache
+from idempotency_store import IdempotencyStore
+
+
+# Shared across handler instances (one handler is created per request)
+IDEMPOTENCY_STORE = IdempotencyStore(
+    max_entries=int(os.getenv('IDEMPOTENCY_MAX_KEYS', '1024')),
+    ttl_seconds=int(os.getenv('IDEMPOTENCY_TTL_SECONDS', str(24 * 3600)))
+)
+
+# Opt-in request profiling (see request_profiler.py)
+PROFILER = RequestProfiler.from_env()
+
+# Active memberships by email, invalidated when an invite upserts one.
+# Memberships deactivated elsewhere stay cached for up to the TTL; callers
+# that grant access must re-check status in their write (see
+# handle_email_signin's magic_links insert).
+MEMBERSHIP_CACHE = MembershipCache(
+    max_entries=int(os.getenv('MEMBERSHIP_CACHE_MAX', '10000')),
+    ttl_seconds=int(os.getenv('MEMBERSHIP_CACHE_TTL_SECONDS', '300')),
+    negative_ttl_seconds=int(os.getenv('MEMBERSHIP_CACHE_NEGATIVE_TTL_SECONDS', '30'))
+)
+
+# POST endpoints that honour the Idempotency-Key header
+IDEMPOTENT_ENDPOINTS = ('/api/auth/invite', '/api/auth/email')
+
 
 class TeslaGradeAuthServer(BaseHTTPRequestHandler):
     
@@ -49,11 +76,23 @@ class TeslaGradeAuthServer(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Idempotency-Key, X-Profile-Token')
         self.end_headers()
     
     def do_GET(self):
         """Serve static files and handle auth callbacks"""
+        if self.path == '/__admin/membership-cache' and PROFILER.is_admin(self):
+            self.send_json_response(MEMBERSHIP_CACHE.stats())
+            return
+        if PROFILER.enabled:
+            if PROFILER.handle_admin(self):
+                return
+            PROFILER.run(self, self.route_get)
+        else:
+            self.route_get()
+    
+    def route_get(self):
+        """Route a GET to its handler"""
         path = self.path
         
         if path == '/' or path == '/auth':
@@ -70,8 +109,25 @@ class TeslaGradeAuthServer(BaseHTTPRequestHandler):
     
     def do_POST(self):
         """Handle API endpoints"""
+        if PROFILER.enabled:
+            PROFILER.run(self, self.route_post)
+        else:
+            self.route_post()
+    
+    def route_post(self):
+        """Apply idempotency handling, then dispatch"""
         path = self.path
         
+        # A blank key counts as no key; it must never become a shared slot
+        idempotency_key = (self.headers.get('Idempotency-Key') or '').strip()[:255]
+        
+        if path in IDEMPOTENT_ENDPOINTS and idempotency_key:
+            self.handle_idempotent_post(path, idempotency_key)
+        else:
+            self.dispatch_post(path)
+    
+    def dispatch_post(self, path):
+        """Route a POST to its handler"""
         if path == '/api/auth/invite':
             self.handle_invite_code()
         elif path == '/api/auth/email':
@@ -79,12 +135,60 @@ class TeslaGradeAuthServer(BaseHTTPRequestHandler):
         else:
             self.send_error(404, "API endpoint not found")
     
+    def handle_idempotent_post(self, path, idempotency_key):
+        """Run a POST at most once per Idempotency-Key, replaying the result"""
+        try:
+            body = self.read_request_body()
+        except (TypeError, ValueError):
+            self.send_json_response({
+                'success': False,
+                'message': 'Valid Content-Length is required'
+            }, 400)
+            return
+        fingerprint = hashlib.sha256(body).hexdigest()
+        store_key = f"{path}:{idempotency_key}"
+        
+        outcome, stored = IDEMPOTENCY_STORE.begin(store_key, fingerprint)
+        
+        if outcome == 'replay':
+            status_code, data = stored
+            self.send_json_response(data, status_code, replayed=True)
+            return
+        if outcome == 'conflict':
+            self.send_json_response({
+                'success': False,
+                'message': 'Idempotency-Key is already in use for a different request'
+            }, 422)
+            return
+        if outcome == 'busy':
+            self.send_json_response({
+                'success': False,
+                'message': 'A request with this Idempotency-Key is still in progress'
+            }, 409)
+            return
+        
+        self._captured_response = None
+        try:
+            self.dispatch_post(path)
+        finally:
+            captured = self._captured_response
+            if captured and captured[0] < 500:
+                IDEMPOTENCY_STORE.complete(store_key, captured[0], captured[1])
+            else:
+                IDEMPOTENCY_STORE.release(store_key)
+    
+    def read_request_body(self):
+        """Read the raw POST body once, caching it for the handler"""
+        if getattr(self, '_request_body', None) is None:
+            content_length = int(self.headers['Content-Length'])
+            self._request_body = self.rfile.read(content_length)
+        return self._request_body
+    
     def handle_invite_code(self):
         """Process invite code authentication"""
         try:
             # Parse request
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            post_data = self.read_request_body()
             data = json.loads(post_data.decode('utf-8'))
             
             code = data.get('code', '').upper().strip()
@@ -167,6 +271,9 @@ class TeslaGradeAuthServer(BaseHTTPRequestHandler):
                     
                     conn.commit()
                     
+                    # Membership changed; next sign-in must see the new tier
+                    MEMBERSHIP_CACHE.invalidate(email=email, user_id=user_id)
+                    
                     self.send_json_response({
                         'success': True,
                         'message': 'Welcome to Stay Hi!',
@@ -186,8 +293,7 @@ class TeslaGradeAuthServer(BaseHTTPRequestHandler):
     def handle_email_signin(self):
         """Process email-based signin"""
         try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            post_data = self.read_request_body()
             data = json.loads(post_data.decode('utf-8'))
             
             email = data.get('email', '').lower().strip()
@@ -199,39 +305,63 @@ class TeslaGradeAuthServer(BaseHTTPRequestHandler):
                 }, 400)
                 return
             
-            with self.get_db_connection() as conn:
+            # Connect only on a cache miss or to write the magic link, so a
+            # cached "no membership" answer never touches the database
+            conn = None
+            
+            def load_membership(lookup_email):
+                nonlocal conn
+                conn = self.get_db_connection()
+                with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                    return self.fetch_active_membership(cur, lookup_email)
+            
+            # Check if user exists and has active membership
+            membership = MEMBERSHIP_CACHE.get(email, load_membership)
+            
+            if not membership:
+                if conn:
+                    conn.close()
+                self.send_json_response({
+                    'success': False,
+                    'message': 'No active membership found for this email'
+                })
+                return
+            
+            if conn is None:
+                conn = self.get_db_connection()
+            
+            with conn:
                 with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                    
-                    # Check if user exists and has active membership
-                    cur.execute("""
-                        SELECT u.id, u.email, um.membership_tier, um.status
-                        FROM auth.users u
-                        JOIN user_memberships um ON u.id = um.user_id
-                        WHERE u.email = %s AND um.status = 'active'
-                    """, (email,))
-                    
-                    user = cur.fetchone()
-                    
-                    if not user:
-                        self.send_json_response({
-                            'success': False,
-                            'message': 'No active membership found for this email'
-                        })
-                        return
                     
                     # Generate magic link token
                     magic_token = secrets.token_urlsafe(32)
                     expires_at = time.time() + (15 * 60)  # 15 minutes
                     
-                    # Store token (you might want to create a magic_links table)
+                    # Store token (you might want to create a magic_links table).
+                    # Re-checks the membership is still active, so a stale
+                    # cache hit can't hand out a link.
                     cur.execute("""
                         INSERT INTO magic_links (token, user_id, expires_at, created_at)
-                        VALUES (%s, %s, to_timestamp(%s), NOW())
+                        SELECT %s, %s, to_timestamp(%s), NOW()
+                        WHERE EXISTS (
+                            SELECT 1 FROM user_memberships
+                            WHERE user_id = %s AND status = 'active'
+                        )
                         ON CONFLICT (user_id) DO UPDATE SET
                             token = EXCLUDED.token,
                             expires_at = EXCLUDED.expires_at,
                             created_at = NOW()
-                    """, (magic_token, user['id'], expires_at))
+                    """, (magic_token, membership.user_id, expires_at, membership.user_id))
+                    
+                    if cur.rowcount == 0:
+                        # Deactivated since it was cached
+                        conn.rollback()
+                        MEMBERSHIP_CACHE.invalidate(email=email, user_id=membership.user_id)
+                        self.send_json_response({
+                            'success': False,
+                            'message': 'No active membership found for this email'
+                        })
+                        return
                     
                     conn.commit()
                     
@@ -298,6 +428,17 @@ class TeslaGradeAuthServer(BaseHTTPRequestHandler):
             print(f"Verification error: {e}")
             self.send_redirect_with_error("Server error during verification")
     
+    def fetch_active_membership(self, cur, email):
+        """Load a user's active membership row (MEMBERSHIP_CACHE loader)"""
+        cur.execute("""
+            SELECT u.id, u.email, um.membership_tier, um.status,
+                   um.trial_days_remaining
+            FROM auth.users u
+            JOIN user_memberships um ON u.id = um.user_id
+            WHERE u.email = %s AND um.status = 'active'
+        """, (email,))
+        return cur.fetchone()
+    
     def get_db_connection(self):
         """Get database connection"""
         return psycopg2.connect(**self.db_config)
@@ -381,11 +522,16 @@ class TeslaGradeAuthServer(BaseHTTPRequestHandler):
             print(f"Email sending error: {e}")
             return False
     
-    def send_json_response(self, data, status_code=200):
+    def send_json_response(self, data, status_code=200, replayed=False):
         """Send JSON response with CORS headers"""
+        # Recorded so idempotent requests can store what was sent
+        self._captured_response = (status_code, data)
+        
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        if replayed:
+            self.send_header('Idempotent-Replayed', 'true')
         self.end_headers()
         self.wfile.write(json.dumps(data).encode())
     
@@ -438,7 +584,15 @@ class TeslaGradeAuthServer(BaseHTTPRequestHandler):
 def run_server():
     """Start the Tesla-grade authentication server"""
     port = 8082
-    server = HTTPServer(('localhost', port), TeslaGradeAuthServer)
+    # Threaded so concurrent retries can be coalesced by the idempotency store
+    server = ThreadingHTTPServer(('localhost', port), TeslaGradeAuthServer)
+    
+    if PROFILER.sample_rate:
+        profiling = f"1 in {PROFILER.sample_rate} requests"
+    elif PROFILER.enabled:
+        profiling = "on demand"
+    else:
+        profiling = "off"
     
     print(f"""
     ⚡ TESLA-GRADE AUTH SERVER RUNNING ⚡
@@ -446,6 +600,7 @@ def run_server():
     🌐 Authentication: http://localhost:{port}/auth
     🔐 Database-backed, secure, efficient
     🚀 Ready for premium users
+    📈 Profiling: {profiling}
     
     Press Ctrl+C to stop
     """)
@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from idempotency_store import IdempotencyStore  # noqa: E402
+
+
+class IdempotencyStoreTTLTest(unittest.TestCase):
+
+    def store_at(self, store, key, now):
+        with mock.patch('idempotency_store.time.time', return_value=now):
+            self.assertEqual(store.begin(key, 'fp'), ('run', None))
+            store.complete(key, 200, {'key': key})
+
+    def begin_at(self, store, key, now):
+        with mock.patch('idempotency_store.time.time', return_value=now):
+            return store.begin(key, 'fp')
+
+    def test_replay_within_ttl(self):
+        store = IdempotencyStore(ttl_seconds=10)
+        self.store_at(store, 'A', 0)
+        self.assertEqual(self.begin_at(store, 'A', 9), ('replay', (200, {'key': 'A'})))
+
+    def test_replayed_key_expires_after_ttl(self):
+        store = IdempotencyStore(ttl_seconds=10)
+        self.store_at(store, 'A', 0)
+        self.store_at(store, 'B', 5)
+        self.assertEqual(self.begin_at(store, 'A', 6)[0], 'replay')
+
+        # A was stored at t=0, so it must not be replayed at t=12
+        self.assertEqual(self.begin_at(store, 'A', 12), ('run', None))
+        self.assertEqual(self.begin_at(store, 'B', 12)[0], 'replay')
+
+    def test_different_body_conflicts(self):
+        store = IdempotencyStore(ttl_seconds=10)
+        self.store_at(store, 'A', 0)
+        with mock.patch('idempotency_store.time.time', return_value=1):
+            self.assertEqual(store.begin('A', 'other'), ('conflict', None))
+
+
+class IdempotencyStoreConcurrencyTest(unittest.TestCase):
+
+    def begin_concurrently(self, store, count, **kwargs):
+        """Start count begin() calls; returns (results, threads, owner_claimed)"""
+        results = []
+        lock = threading.Lock()
+        owner_claimed = threading.Event()
+
+        def worker():
+            outcome = store.begin('K', 'fp', **kwargs)
+            with lock:
+                results.append(outcome)
+            if outcome[0] == 'run':
+                owner_claimed.set()
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return results, threads, owner_claimed
+
+    def wait_for_waiters(self, results, threads, expected):
+        # Waiters block inside begin(); give them time to get there
+        deadline = time.time() + 2
+        while len(results) < len(threads) - expected and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+
+    def test_concurrent_duplicates_run_once_then_replay(self):
+        store = IdempotencyStore()
+        results, threads, owner_claimed = self.begin_concurrently(store, 8)
+        self.assertTrue(owner_claimed.wait(2))
+        self.wait_for_waiters(results, threads, 7)
+        self.assertEqual(len(results), 1)
+
+        store.complete('K', 200, {'ok': True})
+        for thread in threads:
+            thread.join(2)
+
+        outcomes = [outcome for outcome, _ in results]
+        self.assertEqual(outcomes.count('run'), 1)
+        self.assertEqual(outcomes.count('replay'), 7)
+        for outcome, stored in results:
+            if outcome == 'replay':
+                self.assertEqual(stored, (200, {'ok': True}))
+
+    def test_waiter_takes_over_after_release(self):
+        store = IdempotencyStore()
+        self.assertEqual(store.begin('K', 'fp'), ('run', None))
+        results, threads, owner_claimed = self.begin_concurrently(store, 1)
+        self.wait_for_waiters(results, threads, 1)
+        self.assertEqual(results, [])
+
+        store.release('K')
+        threads[0].join(2)
+        self.assertEqual(results, [('run', None)])
+
+    def test_wait_timeout_returns_busy(self):
+        store = IdempotencyStore()
+        self.assertEqual(store.begin('K', 'fp'), ('run', None))
+        self.assertEqual(store.begin('K', 'fp', wait_timeout=0.05), ('busy', None))
+
+    def test_max_entries_drops_oldest(self):
+        store = IdempotencyStore(max_entries=2)
+        for key in ('A', 'B', 'C'):
+            self.assertEqual(store.begin(key, 'fp'), ('run', None))
+            store.complete(key, 200, {'key': key})
+
+        self.assertEqual(store.begin('A', 'fp'), ('run', None))
+        self.assertEqual(store.begin('B', 'fp')[0], 'replay')
+        self.assertEqual(store.begin('C', 'fp')[0], 'replay')
+
+
+if __name__ == '__main__':
+    unittest.main()
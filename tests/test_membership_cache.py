@@ -0,0 +1,133 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from membership_cache import MembershipCache  # noqa: E402
+
+
+def row(user_id, tier='BETA'):
+    return {'id': user_id, 'membership_tier': tier, 'status': 'active',
+            'trial_days_remaining': 30}
+
+
+class CountingLoader:
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def __call__(self, email):
+        self.calls += 1
+        return self.rows.get(email)
+
+
+class MembershipCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('membership_cache.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hit_within_ttl_and_reload_after(self):
+        cache = MembershipCache(ttl_seconds=300)
+        loader = CountingLoader({'a@x': row('u1')})
+
+        self.assertEqual(cache.get('a@x', loader).tier, 'BETA')
+        self.now += 299
+        cache.get('a@x', loader)
+        self.assertEqual(loader.calls, 1)
+
+        self.now += 2
+        cache.get('a@x', loader)
+        self.assertEqual(loader.calls, 2)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_negative_entry_uses_negative_ttl(self):
+        cache = MembershipCache(ttl_seconds=300, negative_ttl_seconds=30)
+        loader = CountingLoader({})
+
+        self.assertIsNone(cache.get('nobody@x', loader))
+        self.now += 29
+        self.assertIsNone(cache.get('nobody@x', loader))
+        self.assertEqual(loader.calls, 1)
+
+        self.now += 2
+        cache.get('nobody@x', loader)
+        self.assertEqual(loader.calls, 2)
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = MembershipCache(max_entries=2)
+        loader = CountingLoader({'a@x': row('u1'), 'b@x': row('u2'), 'c@x': row('u3')})
+
+        cache.get('a@x', loader)
+        cache.get('b@x', loader)
+        cache.get('a@x', loader)  # a is now most recently used
+        cache.get('c@x', loader)  # evicts b
+
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertIsNone(cache.get_by_user_id('u2'))
+        self.assertEqual(cache.get_by_user_id('u1').email, 'a@x')
+
+        calls = loader.calls
+        cache.get('a@x', loader)
+        self.assertEqual(loader.calls, calls)
+        cache.get('b@x', loader)
+        self.assertEqual(loader.calls, calls + 1)
+
+    def test_fill_racing_invalidate_is_dropped(self):
+        cache = MembershipCache()
+
+        def stale_loader(email):
+            # A writer upserts and invalidates while this load is in flight
+            cache.invalidate(email=email)
+            return row('u1', tier='BETA')
+
+        self.assertEqual(cache.get('a@x', stale_loader).tier, 'BETA')
+        self.assertEqual(cache.stats()['entries'], 0)
+
+        fresh = CountingLoader({'a@x': row('u1', tier='VIP')})
+        self.assertEqual(cache.get('a@x', fresh).tier, 'VIP')
+        self.assertEqual(fresh.calls, 1)
+
+    def test_invalidate_by_user_id(self):
+        cache = MembershipCache()
+        cache.put('a@x', row('u1'))
+        cache.invalidate(user_id='u1')
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertIsNone(cache.get_by_user_id('u1'))
+
+    def test_user_id_index_cleaned_on_overwrite(self):
+        cache = MembershipCache()
+        cache.put('a@x', row('u1'))
+        cache.put('a@x', row('u2'))
+
+        self.assertIsNone(cache.get_by_user_id('u1'))
+        self.assertEqual(cache.get_by_user_id('u2').email, 'a@x')
+        self.assertEqual(cache._email_by_user_id, {'u2': 'a@x'})
+
+        cache.put('a@x', None)
+        self.assertEqual(cache._email_by_user_id, {})
+
+    def test_user_id_index_survives_stale_email_removal(self):
+        cache = MembershipCache()
+        cache.put('old@x', row('u1'))
+        cache.put('new@x', row('u1'))  # same user, email changed
+
+        cache.invalidate(email='old@x')
+        self.assertEqual(cache.get_by_user_id('u1').email, 'new@x')
+
+    def test_user_id_index_cleaned_on_eviction(self):
+        cache = MembershipCache(max_entries=1)
+        cache.put('a@x', row('u1'))
+        cache.put('b@x', row('u2'))
+
+        self.assertEqual(cache._email_by_user_id, {'u2': 'b@x'})
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
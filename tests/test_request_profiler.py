@@ -0,0 +1,78 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from request_profiler import RequestProfiler  # noqa: E402
+
+
+class FakeHandler:
+
+    def __init__(self, token=None):
+        self.headers = {'X-Profile-Token': token} if token else {}
+
+
+class RequestProfilerTest(unittest.TestCase):
+
+    def busy_profiler(self, profiler):
+        """Hold the profiler from another thread; returns (release, thread)"""
+        entered = threading.Event()
+        release = threading.Event()
+
+        def slow_request():
+            entered.set()
+            release.wait(2)
+
+        thread = threading.Thread(
+            target=profiler.run, args=(FakeHandler('secret'), slow_request))
+        thread.start()
+        self.assertTrue(entered.wait(2))
+        return release, thread
+
+    def test_disabled_profiler_just_calls_method(self):
+        profiler = RequestProfiler()
+        self.assertEqual(profiler.run(FakeHandler('secret'), lambda: 42), 42)
+        self.assertEqual(profiler.profiled_requests, 0)
+
+    def test_non_ascii_token_is_rejected(self):
+        profiler = RequestProfiler(admin_token='secret')
+        self.assertFalse(profiler.is_admin(FakeHandler('sécret')))
+        self.assertTrue(profiler.is_admin(FakeHandler('secret')))
+
+    def test_forced_request_waits_for_busy_profiler(self):
+        profiler = RequestProfiler(admin_token='secret', forced_wait=2)
+        release, thread = self.busy_profiler(profiler)
+
+        threading.Timer(0.1, release.set).start()
+        profiler.run(FakeHandler('secret'), lambda: None)
+        thread.join(2)
+
+        self.assertEqual(profiler.profiled_requests, 2)
+        self.assertEqual(profiler.forced_skipped, 0)
+
+    def test_forced_skip_is_counted_and_reported(self):
+        profiler = RequestProfiler(admin_token='secret', forced_wait=0.05)
+        release, thread = self.busy_profiler(profiler)
+
+        profiler.run(FakeHandler('secret'), lambda: None)
+        release.set()
+        thread.join(2)
+
+        self.assertEqual(profiler.forced_skipped, 1)
+        self.assertIn('1 forced', profiler.render_text())
+
+    def test_sampled_request_skipped_while_profiler_busy(self):
+        profiler = RequestProfiler(sample_rate=1, admin_token='secret')
+        release, thread = self.busy_profiler(profiler)
+
+        profiler.run(FakeHandler(), lambda: None)
+        release.set()
+        thread.join(2)
+
+        self.assertEqual(profiler.sampled_skipped, 1)
+        self.assertEqual(profiler.profiled_requests, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()